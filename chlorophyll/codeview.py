@@ -1,37 +1,218 @@
 from __future__ import annotations
 
+import fnmatch
 import inspect
+import re
+import sys
+from bisect import bisect_left
+from collections import defaultdict
 from contextlib import suppress
+from functools import lru_cache
+from itertools import accumulate, chain, islice
 from pathlib import Path
 from tkinter import BaseWidget, Event, Menu, Misc, TclError, Text, ttk
 from tkinter.font import Font
-from typing import Any, Callable, Type, Union
+from typing import TYPE_CHECKING, Any, Callable, Generator, Iterable, Iterator, Type, Union
 
-import pygments
-import pygments.lexer
-import pygments.lexers
 import toml
-from pyperclip import copy
+from pygments.filter import apply_filters
+from pygments.token import Token
 from tklinenums import TkLineNumbers
 
 from .schemeparser import _parse_scheme
 
+if TYPE_CHECKING:
+    import pygments.lexer
+
+    LexerType = Union[Type[pygments.lexer.Lexer], pygments.lexer.Lexer]
+
 color_schemes_dir = Path(__file__).parent / "colorschemes"
 
-LexerType = Union[Type[pygments.lexer.Lexer], pygments.lexer.Lexer]
+# highlight_all and edits spanning more lines than _background_highlight_lines are lexed
+# in steps of _tokens_per_step tokens from after_idle callbacks, so they don't block the UI
+_tokens_per_step = 500
+_background_highlight_lines = 1000
+
+# Lines highlighted above and below the visible area, so small scrolls don't show uncolored text
+_visible_overscan_lines = 10
+
+# Edits are re-lexed from a saved lexer state at most _state_search_lines above them,
+# and up to _convergence_lines below them before the rest is left to the background job
+_state_search_lines = 200
+_convergence_lines = 50
+
+_line_col_index = re.compile(r"([1-9]\d*)\.\d+")
+
+
+@lru_cache(maxsize=32)
+def _get_lexer(lexer_class: Type[pygments.lexer.Lexer]) -> pygments.lexer.Lexer:
+    return lexer_class()
+
+
+@lru_cache(maxsize=1)
+def _lexer_tables() -> tuple[dict[str, str], dict[str, str | None], re.Pattern[str] | None] | None:
+    # Pygments goes through every lexer it knows on each lookup, so the tables are built only once.
+    # get_all_lexers() doesn't tell the class names, so they come from Pygments' private mapping,
+    # and if that changes, lookups are left to Pygments
+    try:
+        from pygments.lexers._mapping import LEXERS
+
+        by_alias: dict[str, str] = {}
+        by_extension: dict[str, str | None] = {}
+        other_patterns = []
+        for class_name, (_, _, aliases, filenames, _) in LEXERS.items():
+            for alias in aliases:
+                by_alias.setdefault(alias, class_name)
+            for pattern in filenames:
+                extension = pattern[1:]
+                if pattern.startswith("*.") and not any(char in extension for char in "*?["):
+                    # Lexers sharing an extension are told apart by Pygments
+                    shared = by_extension.get(extension, class_name) != class_name
+                    by_extension[extension] = None if shared else class_name
+                else:
+                    other_patterns.append(fnmatch.translate(pattern))
+    except (ImportError, ValueError):
+        return None
+
+    return by_alias, by_extension, re.compile("|".join(other_patterns)) if other_patterns else None
+
+
+def _find_lexer_class(spec: str) -> Type[pygments.lexer.Lexer]:
+    import pygments.lexers
+
+    tables = _lexer_tables()
+    file_name = Path(spec).name
+    if tables is not None:
+        by_alias, by_extension, other_patterns = tables
+        if other_patterns is None or not other_patterns.match(file_name):
+            class_name = by_extension.get(Path(file_name).suffix) or by_alias.get(spec.lower())
+            if class_name is not None:
+                return getattr(pygments.lexers, class_name)
+
+    lexer_class = pygments.lexers.find_lexer_class_for_filename(file_name)
+    if lexer_class is None:
+        # Raises ClassNotFound, like get_lexer_by_name
+        lexer_class = pygments.lexers.find_lexer_class_by_name(spec)
+    return lexer_class
+
+
+@lru_cache(maxsize=16)
+def _load_color_scheme(name: str) -> tuple[dict, list[tuple[str, str]]]:
+    # Built packages have the built-in schemes as a Python module (see setup.py), so no TOML has to be parsed
+    try:
+        from ._builtin_schemes import color_schemes
+    except ImportError:
+        color_schemes = {}
+
+    color_scheme = color_schemes.get(name)
+    if color_scheme is None:
+        color_scheme = toml.load(color_schemes_dir / f"{name}.toml")
+    return _parse_scheme(color_scheme)
+
+
+@lru_cache(maxsize=16)
+def _parse_frozen_scheme(frozen_scheme: frozenset) -> tuple[dict, list[tuple[str, str]]]:
+    return _parse_scheme({table: dict(values) for table, values in frozen_scheme})
+
+
+def _tab_pixels(font: Any, tab_width: int) -> int:
+    # Named fonts can be reconfigured, only font descriptions are safe to cache
+    if isinstance(font, (tuple, list)):
+        return _measure_tab(tuple(font), tab_width)
+    return Font(font=font).measure(" " * tab_width)
+
+
+@lru_cache(maxsize=32)
+def _measure_tab(font: tuple, tab_width: int) -> int:
+    return Font(font=font).measure(" " * tab_width)
+
+
+# Token types are never freed (their parent type holds a reference to them), so their ids are stable
+_token_names: dict[int, str] = {}
+
+
+def _token_name(token: Any) -> str:
+    name = _token_names.get(id(token))
+    if name is None:
+        # Interned like the color scheme's tag names, so the set of token tags can match them by identity
+        name = _token_names[id(token)] = sys.intern(str(token))
+    return name
+
+
+def _newline_offsets(text: str) -> list[int]:
+    # Every newline is one character after the end of the previous line, this way it's summed up
+    # by accumulate() in C instead of a find() call for each line
+    lines = text.split("\n")
+    lines.pop()
+    offsets = list(accumulate(chain((-1,), map((1).__add__, map(len, lines)))))
+    del offsets[0]
+    return offsets
+
+
+def _offset_index(newlines: list[int], offset: int, line: int) -> str:
+    row = bisect_left(newlines, offset)
+    return f"{line + row}.{offset - newlines[row - 1] - 1 if row else offset}"
+
+
+def _filtered_tokens(
+    lexer: pygments.lexer.Lexer, tokens: Iterable[tuple[int, Any, str]]
+) -> Iterator[tuple[int, Any, str]]:
+    # Filters work on (token, value) pairs, so the offsets are counted from the lengths of the values
+    offset = 0
+    for token, value in apply_filters(((token, value) for _, token, value in tokens), lexer.filters, lexer):
+        yield offset, token, value
+        offset += len(value)
+
+
+def _token_ranges(
+    newlines: list[int], tokens: Iterable[tuple[int, Any, str]], line: int
+) -> dict[Any, list[str]]:
+    ranges: defaultdict[Any, list[str]] = defaultdict(list)
+    text_token, whitespace_token = Token.Text, Token.Text.Whitespace
+    newline_count = len(newlines)
+    row = -1
+    row_start = 0
+
+    for offset, token, value in tokens:
+        # Token types are singletons, so they can be compared by identity
+        if token is text_token or token is whitespace_token:
+            continue
+
+        if row == -1:
+            row = bisect_left(newlines, offset)
+            row_start = newlines[row - 1] + 1 if row else 0
+
+        # The tokens come in order, so the row only has to be moved forward instead of searched for
+        while row < newline_count and newlines[row] < offset:
+            row_start = newlines[row] + 1
+            row += 1
+        start = f"{line + row}.{offset - row_start}"
+
+        end = offset + len(value)
+        while row < newline_count and newlines[row] < end:
+            row_start = newlines[row] + 1
+            row += 1
+        ranges[token] += (start, f"{line + row}.{end - row_start}")
+
+    return ranges
 
 
 class Scrollbar(ttk.Scrollbar):
     def __init__(self, master: CodeView, autohide: bool, *args, **kwargs) -> None:
         super().__init__(master, *args, **kwargs)
         self.autohide = autohide
+        self._hidden = False
 
     def set(self, low: str, high: str) -> None:
         if self.autohide:
-            if float(low) <= 0.0 and float(high) >= 1.0:
-                self.grid_remove()
-            else:
-                self.grid()
+            # This is called on every scroll, but the geometry manager only has to know about changes
+            hidden = float(low) <= 0.0 and float(high) >= 1.0
+            if hidden != self._hidden:
+                self._hidden = hidden
+                if hidden:
+                    self.grid_remove()
+                else:
+                    self.grid()
         super().set(low, high)
 
 
@@ -42,7 +223,7 @@ class CodeView(Text):
     def __init__(
         self,
         master: Misc | None = None,
-        lexer: LexerType = pygments.lexers.TextLexer,
+        lexer: LexerType | None = None,
         color_scheme: dict[str, dict[str, str | int]] | str | None = None,
         tab_width: int = 4,
         linenums_theme: Callable[[], tuple[str, str]] | tuple[str, str] | None = None,
@@ -82,9 +263,24 @@ class CodeView(Text):
         super().configure(
             yscrollcommand=self.vertical_scroll,
             xscrollcommand=self.horizontal_scroll,
-            tabs=Font(font=kwargs["font"]).measure(" " * tab_width),
+            tabs=_tab_pixels(kwargs["font"], tab_width),
         )
 
+        self._highlight_pending: str | None = None
+        self._dirty_lines: tuple[int, int] | None = None
+        self._highlight_job: Generator[int, None, bool] | None = None
+        self._highlight_job_pending: str | None = None
+        self._highlight_job_line = 1
+        self._highlight_job_converge_after: int | None = None
+        self._highlight_job_revision = 0
+        self._revision = 0
+        self._buffer = ""
+        self._buffer_revision = -1
+        self._highlighted_signature: tuple[pygments.lexer.Lexer, int] | None = None
+        self._token_tags: set[str] = set()
+        self._line_states: list[tuple[str, ...] | None] = []
+        self._last_visible_range: tuple[int, int] | None = None
+
         self._context_menu = None
         self._default_context_menu = default_context_menu
         if default_context_menu:
@@ -108,6 +304,12 @@ class CodeView(Text):
 
         self._line_numbers.redraw()
 
+    @staticmethod
+    def resolve_lexer(spec: str) -> Type[pygments.lexer.Lexer]:
+        # Takes a file name or a lexer alias, like Pygments' get_lexer_for_filename and get_lexer_by_name,
+        # but returns the lexer class from lookup tables, which is what CodeView caches lexers by
+        return _find_lexer_class(spec)
+
     @property
     def context_menu(self) -> Menu:
         if self._context_menu is None:
@@ -170,6 +372,8 @@ class CodeView(Text):
         return "break"
 
     def _copy(self, *_):
+        from pyperclip import copy
+
         text = self.get("sel.first", "sel.last")
         if not text:
             text = self.get("insert linestart", "insert lineend")
@@ -179,12 +383,21 @@ class CodeView(Text):
         return "break"
 
     def _cmd_proxy(self, command: str, *args) -> Any:
+        # Most commands (index, mark, tag, see, ...) only read, so they're passed through with a single check
+        edit = command in {"insert", "delete", "replace"}
         try:
-            if command in {"insert", "delete", "replace"}:
-                start_line = int(str(self.tk.call(self._orig, "index", args[0])).split(".")[0])
+            if edit:
+                start_line = self._index_line(args[0])
                 end_line = start_line
-                if len(args) == 3:
-                    end_line = int(str(self.tk.call(self._orig, "index", args[1])).split(".")[0]) - 1
+                if command == "delete" and len(args) == 1:
+                    # Deletes a single character, which can be the newline that joins two lines
+                    end_line = self._index_line(f"{args[0]} + 1 chars")
+                elif command != "insert":
+                    end_line = self._index_line(args[1])
+                else:
+                    # Text inserted at "end" (or past it) goes before the last newline, into the last line
+                    start_line = end_line = min(start_line, self._index_line("end - 1 char"))
+                changes_tokens = command != "insert" or not self._is_inert_insert(args)
             result = self.tk.call(self._orig, command, *args)
         except TclError as e:
             error = str(e)
@@ -192,92 +405,380 @@ class CodeView(Text):
                 return ""
             raise e from None
 
+        if not edit:
+            return result
+
         if command == "insert":
-            if not args[0] == "insert":
-                start_line -= 1
-            lines = args[1].count("\n")
-            if lines == 1:
-                self.highlight_line(f"{start_line}.0")
+            if changes_tokens:
+                lines = "".join(args[1::2]).count("\n")
+                self._schedule_highlight(start_line, start_line + lines, lines)
+        elif command == "replace":
+            lines = "".join(args[2::2]).count("\n")
+            self._schedule_highlight(start_line, start_line + lines, lines - (end_line - start_line))
+        else:
+            self._schedule_highlight(start_line, start_line, start_line - end_line)
+
+        self._revision += 1
+        self.event_generate("<<ContentChanged>>")
+        return result
+
+    def _is_inert_insert(self, args: tuple) -> bool:
+        # Spaces and tabs typed before whitespace (and not at the start of a line) don't change the
+        # tokens around them, and Tk gives them the tags both neighbors have, like a string's tag.
+        # Lexers that track indentation (like YAML) aren't plain RegexLexers, so they're excluded
+        if len(args) != 2 or not self._lexer_has_states or not args[1].isspace() or "\n" in args[1]:
+            return False
+
+        around = self.tk.call(self._orig, "get", f"{args[0]} - 1 chars", f"{args[0]} + 1 chars")
+        return len(around) == 2 and around[0] != "\n" and around[1].isspace()
+
+    def _index_line(self, index: str) -> int:
+        # A "line.column" index already contains the line number, only marks and expressions go to Tk
+        match = _line_col_index.fullmatch(index)
+        if match is not None:
+            return int(match.group(1))
+        return int(str(self.tk.call(self._orig, "index", index)).split(".")[0])
+
+    def _get_text(self, start: str, end: str) -> str:
+        # self.get() would go through _cmd_proxy, this calls the Tk widget directly
+        return self.tk.call(self._orig, "get", start, end)
+
+    def _schedule_highlight(self, start_line: int, end_line: int, line_delta: int = 0) -> None:
+        if self._lexer_is_plain:
+            return
+
+        # The saved states belong to lines, so they move with them (inserted lines have no state yet)
+        if line_delta > 0:
+            self._line_states[start_line:start_line] = [None] * line_delta
+        elif line_delta < 0:
+            del self._line_states[start_line : start_line - line_delta]
+
+        if self._dirty_lines is not None:
+            # Lines below the edit have moved, so the pending range must move with them
+            dirty_start, dirty_end = self._dirty_lines
+            if dirty_start > start_line:
+                dirty_start = max(start_line, dirty_start + line_delta)
+            if dirty_end > start_line:
+                dirty_end = max(start_line, dirty_end + line_delta)
+            start_line = min(start_line, dirty_start)
+            end_line = max(end_line, dirty_end)
+        self._dirty_lines = (start_line, end_line)
+
+        if self._highlight_job is not None and start_line <= self._highlight_job_line:
+            # The edited lines are highlighted by the dirty range pass, the job only has to follow the shift
+            self._highlight_job_line = max(start_line, self._highlight_job_line + line_delta)
+        converge_after = self._highlight_job_converge_after
+        if converge_after is not None and converge_after > start_line:
+            self._highlight_job_converge_after = max(start_line, converge_after + line_delta)
+
+        # Every edit made before Tk gets idle (like the inserts of a paste or an undo) is lexed in one pass
+        if self._highlight_pending is None:
+            self._highlight_pending = self.after_idle(self._do_highlight)
+
+    def _cancel_highlight(self) -> None:
+        if self._highlight_pending is not None:
+            self.after_cancel(self._highlight_pending)
+            self._highlight_pending = None
+        self._dirty_lines = None
+        self._cancel_highlight_job()
+
+    def _do_highlight(self) -> None:
+        self._highlight_pending = None
+        if self._dirty_lines is None:
+            return
+
+        start_line, end_line = self._dirty_lines
+        self._dirty_lines = None
+
+        last_line = self._index_line("end - 1 char")
+        start_line = min(start_line, last_line)
+        end_line = min(end_line, last_line)
+
+        if end_line - start_line > _background_highlight_lines:
+            self._highlight_visible(start_line)
+            self._start_highlight_job(self._closest_state_line(start_line), end_line)
+        else:
+            self._highlight_edited_lines(start_line, end_line, last_line)
+
+    def _highlight_edited_lines(self, start_line: int, end_line: int, last_line: int) -> None:
+        # Lexing starts from the closest line above with a saved state, and goes on below the
+        # edit until a line starts in the same state as before, as the rest can't have changed
+        line = self._closest_state_line(start_line)
+        if self._line_state(line) is None:
+            self.highlight_area(start_line, end_line)
+            return
+
+        window_end = min(end_line + _convergence_lines, last_line)
+        text = self._get_text(f"{line}.0", f"{window_end}.end")
+        if self._tag_tokens(text, line, converge_after=end_line) or window_end == last_line:
+            return
+
+        # The change affects more lines than expected (like an unclosed string),
+        # so it's continued in the background
+        self._start_highlight_job(self._closest_state_line(window_end), end_line)
+
+    def _line_state(self, line: int) -> tuple[str, ...] | None:
+        if not self._lexer_has_states:
+            return None
+        if line == 1:
+            return ("root",)
+        if line - 1 < len(self._line_states):
+            return self._line_states[line - 1]
+        return None
+
+    def _closest_state_line(self, line: int) -> int:
+        if self._lexer_has_states:
+            for known_line in range(line, max(0, line - _state_search_lines), -1):
+                if self._line_state(known_line) is not None:
+                    return known_line
+        return line
+
+    def _visible_range(self) -> tuple[int, int]:
+        first_line = self._index_line("@0,0")
+        last_line = self._index_line(f"@0,{self.winfo_height()}")
+        return max(1, first_line - _visible_overscan_lines), last_line + _visible_overscan_lines
+
+    def _highlight_visible(self, from_line: int, visible_range: tuple[int, int] | None = None) -> None:
+        # This might be lexed from a wrong state, so no state is saved from it,
+        # the background job corrects it when it gets there
+        first_line, last_line = visible_range or self._visible_range()
+        if last_line >= from_line:
+            line = max(first_line, from_line)
+            self._tag_tokens(self._get_text(f"{line}.0", f"{last_line}.end"), line, save_states=False)
+
+    def _start_highlight_job(self, line: int, converge_after: int | None = None) -> None:
+        if self._highlight_job is not None:
+            # The running job may not have reached the lines of the new one, and can't stop early
+            # unless both of them could have
+            line = min(line, self._highlight_job_line)
+            if converge_after is not None and self._highlight_job_converge_after is not None:
+                converge_after = max(converge_after, self._highlight_job_converge_after)
             else:
-                self.highlight_area(start_line, start_line + lines)
-            self.event_generate("<<ContentChanged>>")
-        elif command in {"replace", "delete"}:
-            if start_line == end_line:
-                self.highlight_line(f"{start_line}.0")
+                converge_after = None
+            self._cancel_highlight_job()
+
+        text = self._get_buffer() if line == 1 else self._get_text(f"{line}.0", "end")
+        self._highlight_job = self._iter_tag_tokens(text, line, converge_after)
+        self._highlight_job_line = line
+        self._highlight_job_converge_after = converge_after
+        self._highlight_job_revision = self._revision
+        self._highlight_job_pending = self.after_idle(self._continue_highlight_job)
+
+    def _continue_highlight_job(self) -> None:
+        self._highlight_job_pending = None
+        if self._highlight_job_revision != self._revision:
+            # The text changed under the job, so continue with the current text
+            # The job's line might start inside a multiline token, so it's resumed from a saved state
+            line = self._closest_state_line(self._highlight_job_line)
+            self._start_highlight_job(line, self._highlight_job_converge_after)
+            return
+
+        try:
+            self._highlight_job_line = next(self._highlight_job)
+        except StopIteration:
+            self._highlight_job = None
+        else:
+            self._highlight_job_pending = self.after_idle(self._continue_highlight_job)
+
+    def _cancel_highlight_job(self) -> None:
+        if self._highlight_job_pending is not None:
+            self.after_cancel(self._highlight_job_pending)
+            self._highlight_job_pending = None
+        self._highlight_job = None
+        self._highlight_job_converge_after = None
+
+    def _setup_tags(self, tags: list[tuple[str, str]]) -> None:
+        for tag, color in tags:
+            self.tag_configure(tag, foreground=color)
+            self._token_tags.add(tag)
+
+    def _remove_token_tags(self, start: str, end: str) -> None:
+        # A single script instead of a Tcl call for every token tag
+        if self._token_tags:
+            self.tk.eval(
+                "\n".join(f"{self._orig} tag remove {tag} {start} {end}" for tag in self._token_tags)
+            )
+
+    def _lex(
+        self, text: str, line: int, newlines: list[int], converge_after: int | None, save_states: bool
+    ) -> Iterator[tuple[int, Any, str]]:
+        if self._lexer.filters:
+            # The filters can look ahead in the token stream, so no state is known at the start of a line
+            yield from _filtered_tokens(self._lexer, self._lexer.get_tokens_unprocessed(text))
+            return
+
+        stack = self._line_state(line)
+        if stack is None:
+            # Lexed from the default state, so nothing is known about the states of the following lines
+            yield from self._lexer.get_tokens_unprocessed(text)
+            return
+
+        tokens = self._lexer.get_tokens_unprocessed(text, stack)
+        if not save_states:
+            yield from tokens
+            return
+
+        saved_line = line
+        saved_offset = 0
+        for offset, token, value in tokens:
+            # RegexLexer keeps its position and state stack in local variables, and when a match
+            # starts a line, the lexer can be resumed from there with the same stack. Only the first
+            # match counts, the ones after it at the same offset come from lookahead rules, whose
+            # state depends on the line's content, not on the lines above it
+            if offset != saved_offset and text[offset - 1] == "\n":
+                lexer_locals = tokens.gi_frame.f_locals
             else:
-                self.highlight_area(start_line, end_line)
-            self.event_generate("<<ContentChanged>>")
+                lexer_locals = None
+            if lexer_locals is not None and lexer_locals["pos"] == offset:
+                row = line + bisect_left(newlines, offset)
+                state = tuple(lexer_locals["statestack"])
+                old_state = self._line_state(row)
+
+                # Lines in between started inside a multiline token, so they can't be lexed from there
+                # (this has to happen before stopping too, their old states might be wrong now)
+                self._forget_line_states(saved_line + 1, row)
+                self._line_states[row - 1] = state
+                if converge_after is not None and row > converge_after and old_state == state:
+                    return
+                saved_line = row
+                saved_offset = offset
+
+            yield offset, token, value
+
+        self._forget_line_states(saved_line + 1, line + len(newlines) - 1)
+
+    def _forget_line_states(self, first_line: int, last_line: int) -> None:
+        states = self._line_states
+        if len(states) < last_line:
+            states.extend([None] * (last_line - len(states)))
+        states[first_line - 1 : last_line] = [None] * (last_line - first_line + 1)
+
+    def _iter_tag_tokens(
+        self, text: str, line: int, converge_after: int | None = None, save_states: bool = True
+    ) -> Generator[int, None, bool]:
+        # Pygments' get_tokens() would strip leading newlines and expand tabs, which would
+        # break the offsets, so the unprocessed tokens are used, but with the final newline
+        # that the lexing rules expect
+        if self._lexer_is_plain:
+            return False
+
+        if not text.endswith("\n"):
+            text += "\n"
+        newlines = _newline_offsets(text)
+        tokens = self._lex(text, line, newlines, converge_after, save_states)
+        end_offset = len(text)
+
+        while True:
+            step = list(islice(tokens, _tokens_per_step))
+            if not step:
+                # Returns whether lexing stopped early, because the states converged
+                return end_offset < len(text)
+
+            last_offset, _, last_value = step[-1]
+            end_offset = last_offset + len(last_value)
+            self._remove_token_tags(
+                _offset_index(newlines, step[0][0], line), _offset_index(newlines, end_offset, line)
+            )
 
-        return result
+            # Tk accepts any number of ranges, so it's a single call per tag
+            for token, indices in _token_ranges(newlines, step, line).items():
+                tag = _token_name(token)
+                self.tk.call(self._orig, "tag", "add", tag, *indices)
+                self._token_tags.add(tag)
 
-    def _setup_tags(self, tags: dict[str, str]) -> None:
-        for key, value in tags.items():
-            if isinstance(value, str):
-                self.tag_configure(f"Token.{key}", foreground=value)
+            yield line + bisect_left(newlines, last_offset)
 
-    def highlight_line(self, index: str) -> None:
-        line_num = int(self.index(index).split(".")[0])
-        for tag in self.tag_names(index=None):
-            if tag.startswith("Token"):
-                self.tag_remove(tag, f"{line_num}.0", f"{line_num}.end")
+    def _tag_tokens(
+        self, text: str, line: int, converge_after: int | None = None, save_states: bool = True
+    ) -> bool:
+        steps = self._iter_tag_tokens(text, line, converge_after, save_states)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return bool(stop.value)
 
-        line_text = self.get(f"{line_num}.0", f"{line_num}.end")
-        start_col = 0
+    def highlight_line(self, index: str) -> None:
+        line_num = self._index_line(index)
+        self._tag_tokens(self._get_text(f"{line_num}.0", f"{line_num}.end"), line_num)
 
-        for token, text in pygments.lex(line_text, self._lexer):
-            token = str(token)
-            end_col = start_col + len(text)
-            if token not in {"Token.Text.Whitespace", "Token.Text"}:
-                self.tag_add(token, f"{line_num}.{start_col}", f"{line_num}.{end_col}")
-            start_col = end_col
+    def _get_buffer(self) -> str:
+        # Every change goes through _cmd_proxy, so the text is the same until the revision changes
+        if self._buffer_revision != self._revision:
+            self._buffer = self._get_text("1.0", "end")
+            self._buffer_revision = self._revision
+        return self._buffer
 
     def highlight_all(self) -> None:
-        for tag in self.tag_names(index=None):
-            if tag.startswith("Token"):
-                self.tag_remove(tag, "1.0", "end")
+        # Nothing has been inserted yet, so there's nothing to tag (this is the case in __init__)
+        if self._revision == 0:
+            return
+
+        # Changing only the color scheme doesn't need re-lexing, the existing tags get the new colors
+        signature = (self._lexer, self._revision)
+        if signature == self._highlighted_signature:
+            return
+        self._highlighted_signature = signature
 
-        lines = self.get("1.0", "end")
-        line_offset = lines.count("\n") - lines.lstrip().count("\n")
-        start_index = str(self.tk.call(self._orig, "index", f"1.0 + {line_offset} lines"))
+        self._cancel_highlight()
+        # The saved states might come from another lexer
+        self._line_states = []
 
-        for token, text in pygments.lex(lines, self._lexer):
-            token = str(token)
-            end_index = self.index(f"{start_index} + {len(text)} chars")
-            if token not in {"Token.Text.Whitespace", "Token.Text"}:
-                self.tag_add(token, start_index, end_index)
-            start_index = end_index
+        if self._lexer_is_plain:
+            self._remove_token_tags("1.0", "end")
+            return
+
+        self._highlight_visible(1)
+        self._start_highlight_job(1)
 
     def highlight_area(self, start_line: int | None = None, end_line: int | None = None) -> None:
-        for tag in self.tag_names(index=None):
-            if tag.startswith("Token"):
-                self.tag_remove(tag, f"{start_line}.0", f"{end_line}.end")
-
-        text = self.get(f"{start_line}.0", f"{end_line}.end")
-        line_offset = text.count("\n") - text.lstrip().count("\n")
-        start_index = str(self.tk.call(self._orig, "index", f"{start_line}.0 + {line_offset} lines"))
-        for token, text in pygments.lex(text, self._lexer):
-            token = str(token)
-            end_index = self.index(f"{start_index} + {len(text)} indices")
-            if token not in {"Token.Text.Whitespace", "Token.Text"}:
-                self.tag_add(token, start_index, end_index)
-            start_index = end_index
+        self._tag_tokens(self._get_text(f"{start_line}.0", f"{end_line}.end"), start_line)
 
     def _set_color_scheme(self, color_scheme: dict[str, dict[str, str | int]] | str | None) -> None:
         if isinstance(color_scheme, str) and color_scheme in self._builtin_color_schemes:
-            color_scheme = toml.load(color_schemes_dir / f"{color_scheme}.toml")
+            config, tags = _load_color_scheme(color_scheme)
         elif color_scheme is None:
-            color_scheme = toml.load(color_schemes_dir / "dracula.toml")
-
-        assert isinstance(color_scheme, dict), "Must be a dictionary or a built-in color scheme"
+            config, tags = _load_color_scheme("dracula")
+        else:
+            assert isinstance(color_scheme, dict), "Must be a dictionary or a built-in color scheme"
+
+            try:
+                frozen_scheme = frozenset(
+                    (table, frozenset(values.items())) for table, values in color_scheme.items()
+                )
+            except (AttributeError, TypeError):
+                config, tags = _parse_scheme(color_scheme)
+            else:
+                config, tags = _parse_frozen_scheme(frozen_scheme)
 
-        config, tags = _parse_scheme(color_scheme)
         self.configure(**config)
         self._setup_tags(tags)
 
         self.highlight_all()
 
-    def _set_lexer(self, lexer: LexerType) -> None:
-        self._lexer = lexer() if inspect.isclass(lexer) else lexer
+    def _set_lexer(self, lexer: LexerType | None) -> None:
+        # Importing pygments.lexers is slow, so it's done only when a CodeView is created
+        from pygments.lexer import RegexLexer
+        from pygments.lexers import TextLexer
+
+        if lexer is None:
+            lexer = TextLexer
+
+        self._lexer = _get_lexer(lexer) if inspect.isclass(lexer) else lexer
+        # TextLexer only produces Text tokens, which are never tagged, so lexing can be skipped (unless
+        # a filter changes them)
+        self._lexer_is_plain = type(self._lexer) is TextLexer and not self._lexer.filters
+        # Only RegexLexer's own tokenizer can be resumed from a saved state stack, if there are no
+        # filters in between. The states are read from its local variables, which aren't public API,
+        # so it's only done if they're still there
+        tokenizer = RegexLexer.get_tokens_unprocessed
+        tokenizer_locals = tokenizer.__code__.co_varnames
+        self._lexer_has_states = (
+            not self._lexer.filters
+            and type(self._lexer).get_tokens_unprocessed is tokenizer
+            and "pos" in tokenizer_locals
+            and "statestack" in tokenizer_locals
+        )
         self.highlight_all()
 
     def __setitem__(self, key: str, value) -> None:
@@ -319,17 +820,26 @@ class CodeView(Text):
         self._frame.place_forget()
 
     def destroy(self) -> None:
+        self._cancel_highlight()
         for widget in self._frame.winfo_children():
             BaseWidget.destroy(widget)
         BaseWidget.destroy(self._frame)
 
-    def horizontal_scroll(self, first: str | float, last: str | float) -> CodeView:
+    def horizontal_scroll(self, first: str | float, last: str | float) -> None:
         self._hs.set(first, last)
 
-    def vertical_scroll(self, first: str | float, last: str | float) -> CodeView:
+    def vertical_scroll(self, first: str | float, last: str | float) -> None:
         self._vs.set(first, last)
         self._line_numbers.redraw()
 
-    def scroll_line_update(self, event: Event | None = None) -> CodeView:
+        if self._highlight_job is not None:
+            # Don't wait for the background job if the user scrolls to a part it hasn't reached yet.
+            # Tk calls this on every pixel of scrolling, so only when other lines come into view
+            visible_range = self._visible_range()
+            if visible_range != self._last_visible_range:
+                self._last_visible_range = visible_range
+                self._highlight_visible(self._highlight_job_line, visible_range)
+
+    def scroll_line_update(self, event: Event | None = None) -> None:
         self.horizontal_scroll(*self.xview())
         self.vertical_scroll(*self.yview())
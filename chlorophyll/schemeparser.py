@@ -1,156 +1,177 @@
 from __future__ import annotations
 
-_editor_keys_map = {
-    "background": "bg",
-    "foreground": "fg",
-    "selectbackground": "select_bg",
-    "selectforeground": "select_fg",
-    "inactiveselectbackground": "inactive_select_bg",
-    "insertbackground": "caret",
-    "insertwidth": "caret_width",
-    "borderwidth": "border_width",
-    "highlightthickness": "focus_border_width",
-}
-
-_extras = {
-    "Error": "error",
-    "Literal.Date": "date",
-}
-
-_keywords = {
-    "Keyword.Constant": "constant",
-    "Keyword.Declaration": "declaration",
-    "Keyword.Namespace": "namespace",
-    "Keyword.Pseudo": "pseudo",
-    "Keyword.Reserved": "reserved",
-    "Keyword.Type": "type",
-}
-
-_names = {
-    "Name.Attribute": "attr",
-    "Name.Builtin": "builtin",
-    "Name.Builtin.Pseudo": "builtin_pseudo",
-    "Name.Class": "class",
-    "Name.Constant": "constant",
-    "Name.Decorator": "decorator",
-    "Name.Entity": "entity",
-    "Name.Exception": "exception",
-    "Name.Function": "function",
-    "Name.Function.Magic": "magic_function",
-    "Name.Label": "label",
-    "Name.Namespace": "namespace",
-    "Name.Tag": "tag",
-    "Name.Variable": "variable",
-    "Name.Variable.Class": "class_variable",
-    "Name.Variable.Global": "global_variable",
-    "Name.Variable.Instance": "instance_variable",
-    "Name.Variable.Magic": "magic_variable",
-}
-
-_strings = {
-    "Literal.String.Affix": "affix",
-    "Literal.String.Backtick": "backtick",
-    "Literal.String.Char": "char",
-    "Literal.String.Delimeter": "delimeter",
-    "Literal.String.Doc": "doc",
-    "Literal.String.Double": "double",
-    "Literal.String.Escape": "escape",
-    "Literal.String.Heredoc": "heredoc",
-    "Literal.String.Interpol": "interpol",
-    "Literal.String.Regex": "regex",
-    "Literal.String.Single": "single",
-    "Literal.String.Symbol": "symbol",
-}
-
-_numbers = {
-    "Literal.Number.Bin": "binary",
-    "Literal.Number.Float": "float",
-    "Literal.Number.Hex": "hex",
-    "Literal.Number.Integer": "integer",
-    "Literal.Number.Integer.Long": "long",
-    "Literal.Number.Oct": "octal",
-}
-
-_comments = {
-    "Comment.Hashbang": "hashbang",
-    "Comment.Multiline": "multiline",
-    "Comment.Preproc": "preproc",
-    "Comment.PreprocFile": "preprocfile",
-    "Comment.Single": "single",
-    "Comment.Special": "special",
-}
-
-_generic = {
-    "Generic.Emph": "emphasis",
-    "Generic.Error": "error",
-    "Generic.Heading": "heading",
-    "Generic.Strong": "strong",
-    "Generic.Subheading": "subheading",
-}
+import sys
+
+_editor_keys = (
+    ("background", "bg"),
+    ("foreground", "fg"),
+    ("selectbackground", "select_bg"),
+    ("selectforeground", "select_fg"),
+    ("inactiveselectbackground", "inactive_select_bg"),
+    ("insertbackground", "caret"),
+    ("insertwidth", "caret_width"),
+    ("borderwidth", "border_width"),
+    ("highlightthickness", "focus_border_width"),
+)
+
+_extras = (
+    ("Error", "error"),
+    ("Literal.Date", "date"),
+)
+
+_keywords = (
+    ("Keyword.Constant", "constant"),
+    ("Keyword.Declaration", "declaration"),
+    ("Keyword.Namespace", "namespace"),
+    ("Keyword.Pseudo", "pseudo"),
+    ("Keyword.Reserved", "reserved"),
+    ("Keyword.Type", "type"),
+)
+
+_names = (
+    ("Name.Attribute", "attr"),
+    ("Name.Builtin", "builtin"),
+    ("Name.Builtin.Pseudo", "builtin_pseudo"),
+    ("Name.Class", "class"),
+    ("Name.Constant", "constant"),
+    ("Name.Decorator", "decorator"),
+    ("Name.Entity", "entity"),
+    ("Name.Exception", "exception"),
+    ("Name.Function", "function"),
+    ("Name.Function.Magic", "magic_function"),
+    ("Name.Label", "label"),
+    ("Name.Namespace", "namespace"),
+    ("Name.Tag", "tag"),
+    ("Name.Variable", "variable"),
+    ("Name.Variable.Class", "class_variable"),
+    ("Name.Variable.Global", "global_variable"),
+    ("Name.Variable.Instance", "instance_variable"),
+    ("Name.Variable.Magic", "magic_variable"),
+)
+
+_strings = (
+    ("Literal.String.Affix", "affix"),
+    ("Literal.String.Backtick", "backtick"),
+    ("Literal.String.Char", "char"),
+    ("Literal.String.Delimeter", "delimeter"),
+    ("Literal.String.Doc", "doc"),
+    ("Literal.String.Double", "double"),
+    ("Literal.String.Escape", "escape"),
+    ("Literal.String.Heredoc", "heredoc"),
+    ("Literal.String.Interpol", "interpol"),
+    ("Literal.String.Regex", "regex"),
+    ("Literal.String.Single", "single"),
+    ("Literal.String.Symbol", "symbol"),
+)
+
+_numbers = (
+    ("Literal.Number.Bin", "binary"),
+    ("Literal.Number.Float", "float"),
+    ("Literal.Number.Hex", "hex"),
+    ("Literal.Number.Integer", "integer"),
+    ("Literal.Number.Integer.Long", "long"),
+    ("Literal.Number.Oct", "octal"),
+)
+
+_comments = (
+    ("Comment.Hashbang", "hashbang"),
+    ("Comment.Multiline", "multiline"),
+    ("Comment.Preproc", "preproc"),
+    ("Comment.PreprocFile", "preprocfile"),
+    ("Comment.Single", "single"),
+    ("Comment.Special", "special"),
+)
+
+_generic = (
+    ("Generic.Emph", "emphasis"),
+    ("Generic.Error", "error"),
+    ("Generic.Heading", "heading"),
+    ("Generic.Strong", "strong"),
+    ("Generic.Subheading", "subheading"),
+)
+
+_operators = (
+    ("Operator", "symbol"),
+    ("Operator.Word", "word"),
+)
+
+# Every tag in the order they are configured, _parse_scheme fills a copy of this
+_tags_template: dict[str, str | int | None] = dict.fromkeys(
+    (
+        "Error",
+        "Escape",
+        "Punctuation",
+        "Comment",
+        "Keyword",
+        "Keyword.Other",
+        "Literal.String",
+        "Literal.String.Other",
+        "Name.Other",
+        *(
+            token
+            for map_ in (_keywords, _names, _operators, _strings, _numbers, _comments, _generic, _extras)
+            for token, _ in map_
+        ),
+    )
+)
 
 
 def _parse_table(
     source: dict[str, str | int] | None,
-    map_: dict[str, str],
+    map_: tuple[tuple[str, str], ...],
     fallback: str | int | None = None,
 ) -> dict[str, str | int | None]:
-    result: dict[str, str | int | None] = {}
+    if source is None:
+        # dict(map_) has the tokens as keys, this way both steps run in C
+        return {} if fallback is None else dict.fromkeys(dict(map_), fallback)
 
-    if source is not None:
-        for token, key in map_.items():
-            value = source.get(key)
-            if value is None:
-                value = fallback
-            result[token] = value
-    elif fallback is not None:
-        for token in map_:
-            result[token] = fallback
+    get = source.get
+    # Keys set to None fall back like missing ones
+    return {token: fallback if value is None else value for token, key in map_ for value in (get(key),)}
 
-    return result
 
+def _parse_scheme(color_scheme: dict[str, dict[str, str | int]]) -> tuple[dict, list[tuple[str, str]]]:
+    get_table = color_scheme.get
 
-def _parse_scheme(color_scheme: dict[str, dict[str, str | int]]) -> tuple[dict, dict]:
     editor = {}
-    if "editor" in color_scheme:
-        editor_settings = color_scheme["editor"]
-        for tk_name, key in _editor_keys_map.items():
-            editor[tk_name] = editor_settings.get(key)
+    editor_settings = get_table("editor")
+    if editor_settings is not None:
+        get = editor_settings.get
+        editor = {tk_name: get(key) for tk_name, key in _editor_keys}
 
-    assert "general" in color_scheme, "General table must present in color scheme"
-    general = color_scheme["general"]
+    general = get_table("general")
+    if general is None:
+        raise ValueError("General table must be present in color scheme")
 
-    error = general.get("error")
-    escape = general.get("escape")
-    punctuation = general.get("punctuation")
     general_comment = general.get("comment")
     general_keyword = general.get("keyword")
     general_name = general.get("name")
     general_string = general.get("string")
 
-    tags = {
-        "Error": error,
-        "Escape": escape,
-        "Punctuation": punctuation,
-        "Comment": general_comment,
-        "Keyword": general_keyword,
-        "Keyword.Other": general_keyword,
-        "Literal.String": general_string,
-        "Literal.String.Other": general_string,
-        "Name.Other": general_name,
-    }
-
-    tags.update(**_parse_table(color_scheme.get("keyword"), _keywords, general_keyword))
-    tags.update(**_parse_table(color_scheme.get("name"), _names, general_name))
-    tags.update(
-        **_parse_table(
-            color_scheme.get("operator"),
-            {"Operator": "symbol", "Operator.Word": "word"},
-        )
-    )
-    tags.update(**_parse_table(color_scheme.get("string"), _strings, general_string))
-    tags.update(**_parse_table(color_scheme.get("number"), _numbers))
-    tags.update(**_parse_table(color_scheme.get("comment"), _comments, general_comment))
-    tags.update(**_parse_table(color_scheme.get("generic"), _generic))
-    tags.update(**_parse_table(color_scheme.get("extras"), _extras))
-
-    return editor, tags
+    tags = _tags_template.copy()
+    tags["Error"] = general.get("error")
+    tags["Escape"] = general.get("escape")
+    tags["Punctuation"] = general.get("punctuation")
+    tags["Comment"] = general_comment
+    tags["Keyword"] = tags["Keyword.Other"] = general_keyword
+    tags["Literal.String"] = tags["Literal.String.Other"] = general_string
+    tags["Name.Other"] = general_name
+
+    for source, map_, fallback in (
+        (get_table("keyword"), _keywords, general_keyword),
+        (get_table("name"), _names, general_name),
+        (get_table("operator"), _operators, None),
+        (get_table("string"), _strings, general_string),
+        (get_table("number"), _numbers, None),
+        (get_table("comment"), _comments, general_comment),
+        (get_table("generic"), _generic, None),
+        (get_table("extras"), _extras, None),
+    ):
+        # Tables that aren't in the scheme and have no fallback stay None from the template
+        if source is not None or fallback is not None:
+            tags.update(_parse_table(source, map_, fallback))
+
+    # Tag names are interned, as they are looked up by the highlighter for every token type it tags
+    return editor, [
+        (sys.intern(f"Token.{key}"), value) for key, value in tags.items() if isinstance(value, str)
+    ]
@@ -1,9 +1,42 @@
+from pathlib import Path
+
 from setuptools import setup
+from setuptools.command.build_py import build_py
 
 with open("README.md", "r") as file:
     long_description = file.read()
 
 
+def load_toml(path):
+    try:
+        import tomllib
+    except ImportError:
+        import toml
+
+        return toml.load(path)
+
+    with open(path, "rb") as file:
+        return tomllib.load(file)
+
+
+class BuildPy(build_py):
+    # The built-in color schemes are also written to a Python module, which is
+    # much faster to import than parsing the TOML files when a CodeView is created
+    def run(self):
+        super().run()
+
+        try:
+            schemes = {
+                path.stem: load_toml(path) for path in sorted(Path("chlorophyll/colorschemes").glob("*.toml"))
+            }
+        except ImportError:
+            # No TOML parser at build time, chlorophyll falls back to the TOML files
+            return
+
+        target = Path(self.build_lib) / "chlorophyll" / "_builtin_schemes.py"
+        target.write_text(f"color_schemes = {schemes!r}\n")
+
+
 setup(
     name="chlorophyll",
     version="0.4.2",
@@ -31,4 +64,5 @@ setup(
     ],
     packages=["chlorophyll"],
     package_data={"chlorophyll": ["colorschemes/*"]},
+    cmdclass={"build_py": BuildPy},
 )
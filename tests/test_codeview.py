@@ -0,0 +1,31 @@
+import tkinter
+
+import pytest
+from pygments.lexers import JavascriptLexer
+
+from chlorophyll import CodeView
+
+
+@pytest.fixture
+def root():
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        pytest.skip("no display")
+    root.withdraw()
+    yield root
+    root.destroy()
+
+
+def test_lookahead_state_is_not_saved_for_line(root):
+    # JavascriptLexer checks for a regex with a lookahead at the start of line 2, which
+    # moves it to an error state because the comment isn't closed yet
+    codeview = CodeView(root, lexer=JavascriptLexer)
+    codeview.insert("1.0", "a = (1);\n/* note\nb = 2;\n")
+    root.update_idletasks()
+
+    codeview.insert("2.7", " */")
+    root.update_idletasks()
+
+    assert "Token.Comment.Multiline" in codeview.tag_names("2.0")
+    assert "Token.Error" not in codeview.tag_names("2.0")